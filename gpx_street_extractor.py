@@ -1,17 +1,176 @@
+import hashlib
+import json
+import os
 import sys
-import gpxpy
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import sqlite3
 import time
 import argparse
-from datetime import datetime
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from functools import lru_cache
+from itertools import islice
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON decoding of Nominatim responses
+    orjson = None
+
+try:
+    import httpx
+except ImportError:  # optional: HTTP/2 multiplexing with --http2
+    httpx = None
+
+class RateLimiter:
+    """
+    Enforces a minimum interval between requests using the monotonic clock.
+    Callers only stall when their slot is not yet due, and a single instance
+    is shared by all geocoding workers so the limit applies globally.
+    """
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def acquire(self) -> bool:
+        """
+        Reserve the next send slot, waiting until it is due.
+        Returns False, without waiting any further, once stop() is called.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.min_interval
+        if wait > 0:
+            self._stopped.wait(wait)
+        return not self._stopped.is_set()
+
+    def stop(self):
+        """
+        Wake up all waiting callers and refuse any further sends.
+        """
+        self._stopped.set()
+
+# Shared by every network request in get_street_name; replaced by
+# process_points according to --request-delay.
+_rate_limiter = RateLimiter(min_interval=1.0)
+
+# Returned by StreetCache.get when a coordinate has no (unexpired) entry,
+# since None is itself a cacheable "no street here" answer.
+CACHE_MISS = object()
+
+class StreetCache:
+    """
+    Persistent SQLite cache of one server's reverse-geocode results, keyed by
+    (lat, lon) rounded to 5 decimal places (~1.1 m). Found streets expire
+    after `ttl` seconds; points with no street are kept for the shorter
+    `negative_ttl`.
+    Safe to share between worker threads.
+    """
+    def __init__(self, path: str, ttl: float = 30 * 86400, negative_ttl: float = 86400):
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS streets ("
+                " qlat INTEGER, qlon INTEGER, street TEXT, expires REAL,"
+                " PRIMARY KEY (qlat, qlon))"
+            )
+
+    @staticmethod
+    def _key(lat: float, lon: float) -> tuple:
+        return round(lat * 1e5), round(lon * 1e5)
+
+    def get(self, lat: float, lon: float):
+        """
+        Return the cached street (possibly None), or CACHE_MISS.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT street, expires FROM streets WHERE qlat = ? AND qlon = ?",
+                self._key(lat, lon)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return CACHE_MISS
+        return row[0]
+
+    def set(self, lat: float, lon: float, street):
+        ttl = self.ttl if street else self.negative_ttl
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO streets VALUES (?, ?, ?, ?)",
+                (*self._key(lat, lon), street, time.time() + ttl)
+            )
+
+# Opened by main unless --no-cache is given.
+_street_cache = None
+
+# Base URL of the Nominatim server; set by main from --nominatim-url.
+_nominatim_url = "https://nominatim.openstreetmap.org"
+
+# One pooled session for all workers, so connections to Nominatim are kept
+# alive and reused instead of paying a TCP+TLS handshake on every request.
+# With --http2, main replaces it with an httpx client (see open_http2_client).
+_session = requests.Session()
+# REQUIRED: Provide a descriptive User-Agent per Nominatim usage policy
+HEADERS = {
+    "User-Agent": "MyStreetExtractor/1.0 (myemail@example.com)"
+}
+_session.headers.update(HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# Errors get_street_name reports as a failed request, whichever client is in use
+REQUEST_ERRORS = (requests.exceptions.RequestException, ValueError)
+if httpx is not None:
+    REQUEST_ERRORS += (httpx.HTTPError,)
+
+def open_http2_client():
+    """
+    An httpx client that multiplexes the workers' requests over a few HTTP/2
+    connections, avoiding HTTP/1.1's one-request-per-connection limit.
+    Requires httpx with HTTP/2 support (pip install 'httpx[http2]').
+
+    Redirects are followed, as with the requests session, but only connection
+    errors are retried: unlike the session, 429/5xx responses are not.
+    """
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+    )
+    return httpx.Client(headers=HEADERS, transport=transport, follow_redirects=True)
+
+def is_local_url(url: str) -> bool:
+    """
+    True if the URL points at this machine (e.g. a self-hosted Nominatim).
+    """
+    return urlparse(url).hostname in ("localhost", "127.0.0.1", "::1")
 
 def format_time_delta(seconds: float) -> str:
     """
     Convert float seconds into [MM:SS] format.
     """
-    mm = int(seconds // 60)
-    ss = int(seconds % 60)
-    return f"{mm:02d}:{ss:02d}"
+    return "%02d:%02d" % divmod(seconds, 60)
 
 def debug_print(debug_mode, *args):
     """
@@ -28,168 +187,483 @@ def debug_gpx_contents(gpx, debug_mode):
     if not debug_mode:
         return
     print("DEBUG: Number of tracks =", len(gpx.tracks))
-    for t_index, track in enumerate(gpx.tracks):
-        print(f"DEBUG:   Track {t_index} has {len(track.segments)} segment(s).")
-        for s_index, segment in enumerate(track.segments):
-            print(f"DEBUG:     Segment {s_index} has {len(segment.points)} point(s).")
+    for t_index, segments in enumerate(gpx.tracks):
+        print(f"DEBUG:   Track {t_index} has {len(segments)} segment(s).")
+        for s_index, n_points in enumerate(segments):
+            print(f"DEBUG:     Segment {s_index} has {n_points} point(s).")
 
     print("DEBUG: Number of routes =", len(gpx.routes))
-    for r_index, route in enumerate(gpx.routes):
-        print(f"DEBUG:   Route {r_index} has {len(route.points)} point(s).")
+    for r_index, n_points in enumerate(gpx.routes):
+        print(f"DEBUG:   Route {r_index} has {n_points} point(s).")
 
-    print("DEBUG: Number of waypoints =", len(gpx.waypoints))
+    print("DEBUG: Number of waypoints =", gpx.waypoints)
 
 def get_street_name(lat: float, lon: float, debug_mode: bool) -> str:
     """
-    Reverse-geocodes latitude/longitude using the public Nominatim API.
+    Reverse-geocodes latitude/longitude using the Nominatim API at
+    _nominatim_url (the public server by default).
     Returns the street name (if found) or None.
+
+    Answers are looked up in (and saved to) the persistent street cache,
+    when one is open, so only unseen coordinates hit the network.
+
+    Names are interned, so the debouncer's street comparisons reduce to
+    identity checks.
     """
-    url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=jsonv2"
+    if _street_cache is not None:
+        cached = _street_cache.get(lat, lon)
+        if cached is not CACHE_MISS:
+            return sys.intern(cached) if cached else None
+
+    url = f"{_nominatim_url}/reverse?lat={lat}&lon={lon}&format=jsonv2"
 
-    # REQUIRED: Provide a descriptive User-Agent per Nominatim usage policy
-    headers = {
-        "User-Agent": "MyStreetExtractor/1.0 (myemail@example.com)"
-    }
+    # Only actual network requests count against the rate limit
+    if not _rate_limiter.acquire():
+        return None  # the run is being interrupted
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _session.get(url, timeout=15)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content) if orjson else response.json()
             address = data.get("address", {})
             # Usually "road"; fallback to "footway"/"pedestrian"
             street_name = address.get("road") or address.get("footway") or address.get("pedestrian")
+            street_name = sys.intern(street_name) if street_name else None
+            if _street_cache is not None:
+                _street_cache.set(lat, lon, street_name)
             return street_name
         else:
             if debug_mode:
                 print(f"WARNING: Nominatim returned status {response.status_code}")
-    except requests.exceptions.RequestException as e:
+    except REQUEST_ERRORS as e:
         if debug_mode:
             print(f"WARNING: Nominatim request failed: {e}")
 
     return None
 
-def collect_points(gpx) -> list:
+@lru_cache(maxsize=4096)
+def cached_street_name(qlat: int, qlon: int, debug_mode: bool) -> str:
+    """
+    In-process memo in front of get_street_name. Coordinates are passed as
+    integers in units of 1e-4 degrees (~11 m), so nearby points share an entry.
+    """
+    return get_street_name(qlat / 1e4, qlon / 1e4, debug_mode)
+
+class RoadIndex:
+    """
+    Offline street lookup against a GeoPackage of OSM roads: each point gets
+    the name of the nearest named road within `max_distance` meters, found
+    through a spatial index. Requires geopandas (imported on first use).
+    """
+    def __init__(self, path: str, max_distance: float = 50.0):
+        import geopandas
+
+        self._geopandas = geopandas
+        self.max_distance = max_distance
+        roads = geopandas.read_file(path)
+        if roads.crs is None:
+            roads = roads.set_crs("EPSG:4326")
+        roads = roads[roads["name"].notna()]
+        # Measure distances in meters rather than degrees
+        self._crs = roads.estimate_utm_crs()
+        self._roads = roads.to_crs(self._crs).reset_index(drop=True)
+        self._names = [sys.intern(name) for name in self._roads["name"]]
+        self._sindex = self._roads.sindex
+
+    def street_names(self, lats: np.ndarray, lons: np.ndarray) -> list:
+        """
+        Street name (or None) for each (lat, lon), in one vectorized query.
+        """
+        query = self._geopandas.GeoSeries(
+            self._geopandas.points_from_xy(lons, lats), crs="EPSG:4326"
+        ).to_crs(self._crs)
+        point_idx, road_idx = self._sindex.nearest(
+            query, return_all=False, max_distance=self.max_distance
+        )
+        streets = [None] * len(lats)
+        for p, r in zip(point_idx.tolist(), road_idx.tolist()):
+            streets[p] = self._names[r]
+        return streets
+
+@dataclass
+class Points:
     """
-    Collect all points from the GPX in a single list of (lat, lon, time).
+    GPX points stored as parallel arrays: latitudes and longitudes (float64)
+    and times (datetime64[ns], NaT where a point has no time).
+    """
+    lats: np.ndarray
+    lons: np.ndarray
+    times: np.ndarray
+
+    def __len__(self):
+        return len(self.lats)
+
+# Result of read_gpx: the points to process, plus the GPX structure for
+# debug output (point counts per track segment, per route, and of waypoints).
+GpxData = namedtuple("GpxData", ["points", "tracks", "routes", "waypoints"])
+
+def _local_name(tag: str) -> str:
+    """
+    Strip the XML namespace, so both GPX 1.0 and 1.1 files are understood.
+    """
+    return tag.rpartition("}")[2]
+
+def parse_gpx_time(text: str):
+    """
+    Parse an ISO 8601 <time> value into a naive UTC datetime,
+    or return None if it can't be parsed.
+    """
+    text = text.strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        t = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc).replace(tzinfo=None)
+    return t
+
+# Grid cells are packed into one int64 as (qlat + 900000) * GRID_LON_SPAN + (qlon + 1800000),
+# where qlat/qlon are coordinates in 1e-4 degree units; the span equals the
+# number of possible longitude values (0..3,600,000 after offsetting), so
+# distinct cells never collide.
+GRID_LON_SPAN = 3_600_001
+
+def grid_keys(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Pack coordinates into int64 keys of the ~11 m grid used by cached_street_name.
+    """
+    qlats = np.round(lats * 1e4).astype(np.int64) + 900_000
+    qlons = np.round(lons * 1e4).astype(np.int64) + 1_800_000
+    return qlats * GRID_LON_SPAN + qlons
+
+def grid_key_street_name(key: int, debug_mode: bool) -> str:
+    """
+    Look up the street for a packed grid key (see grid_keys).
+    """
+    qlat, qlon = divmod(int(key), GRID_LON_SPAN)
+    return cached_street_name(qlat - 900_000, qlon - 1_800_000, debug_mode)
+
+# Mean Earth radius in meters
+EARTH_RADIUS_M = 6_371_008.8
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great-circle distance in meters between (arrays of) points.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def distance_gate(lats: np.ndarray, lons: np.ndarray, min_distance: float) -> np.ndarray:
+    """
+    Boolean mask of the samples that need a street lookup.
+
+    The track is cut into stretches of `min_distance` meters of travelled
+    distance, and only the first sample of each stretch is looked up; the rest
+    reuse its street. Since the path is never shorter than the straight line,
+    a skipped sample is always within `min_distance` of the one it copies.
+    """
+    query = np.ones(len(lats), dtype=bool)
+    if min_distance <= 0 or len(lats) < 2:
+        return query
+    steps = haversine(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    stretch = np.floor(np.concatenate(([0.0], np.cumsum(steps))) / min_distance)
+    query[1:] = stretch[1:] != stretch[:-1]
+    return query
+
+def geocode_grid_keys(keys, workers: int, debug_mode: bool) -> list:
+    """
+    Look up the street for each packed grid key, returning them in the order
+    of `keys`. A sliding window keeps at most `workers` lookups submitted at
+    a time, so long tracks don't queue thousands of futures up front.
+
+    If the run is interrupted (e.g. Ctrl+C), queued lookups are cancelled and
+    the rate limiter is stopped, so lookups already waiting for a send slot
+    return at once without sending their request.
+    """
+    streets = [None] * len(keys)
+    todo = iter(enumerate(keys))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {
+            executor.submit(grid_key_street_name, key, debug_mode): index
+            for index, key in islice(todo, workers)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                streets[pending.pop(future)] = future.result()
+            for index, key in islice(todo, len(done)):
+                pending[executor.submit(grid_key_street_name, key, debug_mode)] = index
+    except BaseException:
+        _rate_limiter.stop()
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return streets
+
+def read_gpx(path: str) -> GpxData:
+    """
+    Stream the GPX file and collect all points as parallel arrays of lat, lon, time.
     Priority:
       1) Tracks (trkpt)
       2) Routes (rtept)
       3) Waypoints (wpt)
 
-    Once we find track points, we skip routes/waypoints.
+    Once we find track points, we skip routes/waypoints. Elements are discarded
+    as soon as their point is read, so memory stays flat for large files.
     """
-    points = []
+    # Per point kind: lists of lats, lons and times
+    collected = {kind: ([], [], []) for kind in ("trkpt", "rtept", "wpt")}
+    tracks, routes = [], []
+    parents = []
+
+    for event, el in ET.iterparse(path, events=("start", "end")):
+        tag = _local_name(el.tag)
+        if event == "start":
+            if tag == "trk":
+                tracks.append([])
+            elif tag == "trkseg" and tracks:
+                tracks[-1].append(0)
+            elif tag == "rte":
+                routes.append(0)
+            parents.append(el)
+            continue
 
-    # 1) Tracks
-    if gpx.tracks:
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for pt in segment.points:
-                    points.append((pt.latitude, pt.longitude, pt.time))
-        if points:
-            return points
+        parents.pop()
+        if tag not in ("trkpt", "rtept", "wpt"):
+            continue
 
-    # 2) Routes
-    if gpx.routes:
-        for route in gpx.routes:
-            for pt in route.points:
-                points.append((pt.latitude, pt.longitude, pt.time))
-        if points:
-            return points
+        # Drop the finished point from the tree; its attributes stay readable
+        if parents:
+            parents[-1].remove(el)
+
+        point_time = None
+        for child in el:
+            if _local_name(child.tag) == "time" and child.text:
+                point_time = parse_gpx_time(child.text)
+                break
+
+        if tag == "trkpt" and tracks and tracks[-1]:
+            tracks[-1][-1] += 1
+        elif tag == "rtept" and routes:
+            routes[-1] += 1
+        elif tag != "wpt":
+            continue
+        lats, lons, times = collected[tag]
+        lats.append(float(el.get("lat")))
+        lons.append(float(el.get("lon")))
+        times.append(point_time)
+
+    lats, lons, times = next(
+        (c for c in collected.values() if c[0]),
+        collected["wpt"]
+    )
+    points = Points(
+        lats=np.array(lats, dtype=np.float64),
+        lons=np.array(lons, dtype=np.float64),
+        times=np.array(times, dtype="datetime64[ns]")
+    )
+    return GpxData(points, tracks, routes, len(collected["wpt"][0]))
 
-    # 3) Waypoints
-    if gpx.waypoints:
-        for wpt in gpx.waypoints:
-            points.append((wpt.latitude, wpt.longitude, wpt.time))
+# Bump when read_gpx's output changes, so stale parsed-GPX cache entries are ignored
+PARSED_CACHE_VERSION = b"1"
 
-    return points
+def load_gpx(path: str, cache_dir: str = None) -> GpxData:
+    """
+    read_gpx, with the result cached in `cache_dir` (if given) as an .npz file
+    keyed by the SHA-256 of the file's contents. Re-running on the same GPX,
+    e.g. to tune --threshold, then skips parsing entirely.
+    """
+    if cache_dir is None:
+        return read_gpx(path)
+
+    # Hash in chunks so large files are never held in memory whole
+    sha = hashlib.sha256(PARSED_CACHE_VERSION)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    cache_path = os.path.join(os.path.expanduser(cache_dir), "parsed", f"{digest}.npz")
+    try:
+        with np.load(cache_path) as arrays:
+            points = Points(lats=arrays["lats"], lons=arrays["lons"], times=arrays["times"])
+            tracks, routes, waypoints = json.loads(arrays["structure"].item())
+        return GpxData(points, tracks, routes, waypoints)
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        pass  # not cached yet (or unreadable): parse it
+
+    gpx = read_gpx(path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # Write to a temporary file first so an interrupted run can't leave a
+    # truncated cache entry behind
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            lats=gpx.points.lats,
+            lons=gpx.points.lons,
+            times=gpx.points.times,
+            structure=np.array(json.dumps([gpx.tracks, gpx.routes, gpx.waypoints]))
+        )
+    os.replace(tmp_path, cache_path)
+    return gpx
+
+def time_offsets(times: np.ndarray) -> np.ndarray:
+    """
+    Seconds elapsed since the first non-NaT entry of a datetime64 array,
+    computed in one vectorized pass. Entries without a time get 0.0.
+    """
+    offsets = np.zeros(len(times))
+    valid = ~np.isnat(times)
+    if valid.any():
+        start = times[valid][0]
+        offsets[valid] = (times[valid] - start) / np.timedelta64(1, "s")
+    return offsets
+
+def debounce_streets(street_ids: np.ndarray, offsets: np.ndarray,
+                     threshold: int, final_threshold: int) -> list:
+    """
+    Turn the street of each sampled point into a list of (offset, street_id)
+    confirmations. `street_ids` holds an integer id per sample (-1 where no
+    street was found) and `offsets` each sample's time offset.
+
+    Samples without a street are skipped, and the rest are grouped into runs of
+    consecutive hits on the same street:
+    - A run of at least `threshold` hits confirms a new street. (A lone hit is
+      only ever a candidate, so it always takes at least 2.)
+      The offset is that of the *first* hit of the run.
+    - If the final run has >= `final_threshold` hits (but < threshold),
+      we confirm it anyway so we don't miss a short final segment.
 
-def process_points(points: list,
+    Runs are found with array operations, so the cost doesn't grow with a
+    Python-level loop over every sample.
+    """
+    hits = street_ids >= 0
+    ids = street_ids[hits]
+    if len(ids) == 0:
+        return []
+    hit_offsets = offsets[hits]
+
+    # Run starts, lengths, and the street of each run
+    starts = np.flatnonzero(np.diff(ids, prepend=-1))
+    lengths = np.diff(starts, append=len(ids))
+    run_ids = ids[starts]
+
+    # Long enough runs confirm their street, unless the previous confirmed
+    # run was already on that street
+    confirmed = np.flatnonzero(lengths >= max(threshold, 2))
+    if len(confirmed):
+        is_new = np.ones(len(confirmed), dtype=bool)
+        is_new[1:] = run_ids[confirmed[1:]] != run_ids[confirmed[:-1]]
+        confirmed = confirmed[is_new]
+    confirmations = list(zip(hit_offsets[starts[confirmed]].tolist(), run_ids[confirmed].tolist()))
+
+    confirmed_id = run_ids[confirmed[-1]] if len(confirmed) else -1
+    if run_ids[-1] != confirmed_id and lengths[-1] >= final_threshold:
+        confirmations.append((hit_offsets[starts[-1]].item(), run_ids[-1].item()))
+
+    return confirmations
+
+def process_points(points: Points,
                    downsample: int,
                    request_delay: float,
                    threshold: int,
                    final_threshold: int,
-                   debug_mode: bool):
+                   debug_mode: bool,
+                   workers: int = 8,
+                   road_index: RoadIndex = None,
+                   min_distance: float = 15.0):
     """
     Loops over points (down-sampled), does a reverse-geocode,
     and prints [MM:SS StreetName] for the street we are truly on.
 
-    - We store each "candidate" street's consecutive hits in a list of times.
-      Once we reach `threshold` hits, we confirm the new street.
-      The printed offset is from the *first* time we saw that candidate street.
-    - If we end with a candidate having >= `final_threshold` hits (but < threshold),
-      we confirm it anyway so we don't miss a short final segment.
+    Up to `workers` geocodes are in flight at once, while a shared rate limiter
+    keeps the overall request rate at one per `request_delay` seconds.
+    If a `road_index` is given, streets are looked up locally instead.
+    Samples less than `min_distance` meters along the track from the last
+    looked-up sample reuse its street (see distance_gate).
+
+    See debounce_streets for how the per-point streets are turned into
+    confirmed street changes.
 
     If debug_mode is True, also print each processed coordinate and returned street.
     """
 
-    if not points:
+    if len(points) == 0:
         print("No track, route, or waypoint data found in this GPX.")
         return
 
-    # Find first non-None time to serve as the "start"
-    start_time = None
-    for _, _, t in points:
-        if t is not None:
-            start_time = t
-            break
-
-    confirmed_street = None  # Street we have fully confirmed
-    candidate_street = None  # Street we are considering (not yet confirmed)
-    candidate_times = []     # List of time offsets for consecutive hits on candidate_street
-
-    for i, (lat, lon, point_time) in enumerate(points):
-        if i % downsample != 0:
-            continue
-
-        # Polite delay to avoid Nominatim blocking
-        time.sleep(request_delay)
-
-        # Compute time offset for this point
-        if start_time and point_time:
-            time_diff = (point_time - start_time).total_seconds()
-        else:
-            time_diff = 0.0
-
-        # Reverse-geocode the current lat/lon
-        street = get_street_name(lat, lon, debug_mode)
-
-        # Print debug info about each processed point
-        debug_print(debug_mode, f"i={i}, lat={lat:.6f}, lon={lon:.6f}, street={street}")
-
-        if not street:
-            # If we fail to get a street, skip it
-            continue
-
-        if street == confirmed_street:
-            # We're still on the confirmed street, so reset candidate
-            candidate_street = None
-            candidate_times = []
-            continue
-
-        # If it's the same as our current candidate, keep counting
-        if street == candidate_street:
-            candidate_times.append(time_diff)
-
-            # If we meet the threshold, confirm the new street
-            if len(candidate_times) >= threshold:
-                # Confirm at the time offset of the *first* candidate hit
-                confirm_offset = candidate_times[0]
-                confirmed_street = candidate_street
-                print(f"{format_time_delta(confirm_offset)} {confirmed_street}")
-        else:
-            # It's a different street than our candidate => new candidate
-            candidate_street = street
-            candidate_times = [time_diff]
+    # Time offset of every point from the first one that has a time
+    offsets = time_offsets(points.times)
+
+    # Polite rate limit to avoid Nominatim blocking, shared by all workers
+    global _rate_limiter
+    _rate_limiter = RateLimiter(min_interval=request_delay)
+
+    # Only look up samples that moved far enough along the track; every
+    # sample then takes the street of the latest looked-up sample.
+    samples = range(0, len(points), downsample)
+    sample_lats = points.lats[::downsample]
+    sample_lons = points.lons[::downsample]
+    queried = distance_gate(sample_lats, sample_lons, min_distance)
+    source = np.cumsum(queried) - 1
+
+    if road_index is not None:
+        # Local lookups are cheap, so query the exact positions of the
+        # looked-up samples in one vectorized call
+        streets = road_index.street_names(sample_lats[queried], sample_lons[queried])
+        inverse = np.arange(len(streets))
+        debug_print(debug_mode, f"{len(samples)} sampled point(s), {len(streets)} after distance gating")
+    else:
+        # Quantize the looked-up points onto the ~11 m grid used by
+        # cached_street_name, and geocode each distinct cell only once,
+        # concurrently.
+        keys = grid_keys(sample_lats[queried], sample_lons[queried])
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        debug_print(debug_mode, f"{len(samples)} sampled point(s), {len(keys)} after distance gating, "
+                                f"in {len(unique_keys)} distinct grid cell(s)")
+        streets = geocode_grid_keys(unique_keys, workers, debug_mode)
+
+    # Number the distinct street names, so samples can be handled as int ids,
+    # then scatter them back to every sample so the debouncing below still
+    # sees the points in order.
+    name_ids = {}
+    ids = np.array(
+        [name_ids.setdefault(street, len(name_ids)) if street else -1 for street in streets],
+        dtype=np.int32
+    )
+    street_names = list(name_ids)
+    street_ids = ids[inverse[source]]
 
-    # After the loop ends, if we still have a candidate but never reached `threshold`,
-    # check if we meet the final_threshold to confirm it anyway.
-    if candidate_street and candidate_street != confirmed_street:
-        if len(candidate_times) >= final_threshold:
-            confirm_offset = candidate_times[0]
-            print(f"{format_time_delta(confirm_offset)} {candidate_street}")
+    # Output is assembled first and written in one go, rather than one
+    # print() (and stdout lock round-trip) per line
+    if debug_mode:
+        # Debug info about each processed point
+        sys.stdout.write("".join(
+            "DEBUG: i=%d, lat=%.6f, lon=%.6f, street=%s\n" % (i, lat, lon, street)
+            for i, lat, lon, street in zip(
+                samples, sample_lats.tolist(), sample_lons.tolist(),
+                np.array(streets, dtype=object)[inverse[source]]
+            )
+        ))
+
+    confirmations = debounce_streets(street_ids, offsets[::downsample], threshold, final_threshold)
+    sys.stdout.write("".join(
+        "%s %s\n" % (format_time_delta(confirm_offset), street_names[street_id])
+        for confirm_offset, street_id in confirmations
+    ))
+    sys.stdout.flush()
 
 def main():
+    # Flush output line by line even when piped (e.g. to `tee` or `less`), so
+    # debug output and warnings show up as they happen. Confirmed streets are
+    # only known once every cell has been geocoded, so they still arrive at
+    # the end of the run.
+    sys.stdout.reconfigure(line_buffering=True)
+
     # -----------------------
     # 1. Parse Command-Line
     # -----------------------
@@ -197,22 +671,70 @@ def main():
     parser.add_argument("gpx_file", help="Path to the GPX file.")
     parser.add_argument("--downsample", type=int, default=5,
                         help="Only geocode 1 out of every N points (default 5).")
-    parser.add_argument("--request-delay", type=float, default=0.5,
-                        help="Delay in seconds between requests to avoid throttling (default 0.5).")
+    parser.add_argument("--request-delay", type=float, default=1.0,
+                        help="Minimum delay in seconds between requests, across all workers, to avoid throttling (default 1.0).")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Number of reverse-geocode requests kept in flight concurrently (default 8).")
+    parser.add_argument("--min-distance", type=float, default=15.0,
+                        help="Reuse the previous street for samples less than this many meters along the track "
+                             "from the last looked-up one; 0 disables (default 15).")
     parser.add_argument("--threshold", type=int, default=3,
                         help="Number of consecutive hits required to confirm a new street (default 3).")
     parser.add_argument("--final-threshold", type=int, default=2,
                         help="If we end the track with fewer than 'threshold' hits, but at least this many, we confirm the last street (default 2).")
+    parser.add_argument("--nominatim-url", default="https://nominatim.openstreetmap.org",
+                        help="Base URL of the Nominatim server (default https://nominatim.openstreetmap.org). "
+                             "Requests to a localhost server are not rate-limited.")
+    parser.add_argument("--http2", action="store_true",
+                        help="Send requests over multiplexed HTTP/2 connections (requires httpx[http2]). "
+                             "Only connection errors are retried; 429/5xx responses are not.")
+    parser.add_argument("--roads-gpkg", metavar="PATH",
+                        help="GeoPackage of OSM roads to look streets up offline instead of calling Nominatim "
+                             "(requires geopandas).")
+    parser.add_argument("--cache-dir", default="~/.cache/gpx_street_extractor",
+                        help="Directory for the persistent geocode and parsed-GPX caches (default ~/.cache/gpx_street_extractor).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable the persistent geocode and parsed-GPX caches.")
     parser.add_argument("--debug", action="store_true",
                         help="Enable debug mode (prints geocode results for each point).")
 
     args = parser.parse_args()
 
+    global _nominatim_url
+    _nominatim_url = args.nominatim_url.rstrip("/")
+    request_delay = args.request_delay
+    if is_local_url(_nominatim_url):
+        # The public usage policy doesn't apply to our own server
+        debug_print(args.debug, f"Local Nominatim at {_nominatim_url}; rate limiting disabled")
+        request_delay = 0.0
+
+    if args.http2:
+        global _session
+        try:
+            if httpx is None:
+                raise ImportError("httpx")
+            _session = open_http2_client()
+        except ImportError:
+            parser.error("--http2 requires httpx with HTTP/2 support (pip install 'httpx[http2]')")
+
+    road_index = None
+    if args.roads_gpkg:
+        try:
+            road_index = RoadIndex(args.roads_gpkg)
+        except ImportError:
+            parser.error("--roads-gpkg requires geopandas (pip install geopandas)")
+
+    global _street_cache
+    if not args.no_cache:
+        # One cache file per server, so answers from different Nominatim
+        # instances (with different data) never mix
+        server_hash = hashlib.sha256(_nominatim_url.encode()).hexdigest()[:16]
+        _street_cache = StreetCache(os.path.join(args.cache_dir, f"streets-{server_hash}.sqlite"))
+
     # -----------------------
     # 2. Parse the GPX file
     # -----------------------
-    with open(args.gpx_file, "r", encoding="utf-8") as f:
-        gpx = gpxpy.parse(f)
+    gpx = load_gpx(args.gpx_file, cache_dir=None if args.no_cache else args.cache_dir)
 
     # -----------------------
     # 3. Debug info if needed
@@ -222,8 +744,8 @@ def main():
     # -----------------------
     # 4. Collect all points
     # -----------------------
-    points = collect_points(gpx)
-    if not points:
+    points = gpx.points
+    if len(points) == 0:
         print("No track/route/waypoint data found in this GPX.")
         return
 
@@ -233,10 +755,13 @@ def main():
     process_points(
         points=points,
         downsample=args.downsample,
-        request_delay=args.request_delay,
+        request_delay=request_delay,
         threshold=args.threshold,
         final_threshold=args.final_threshold,
-        debug_mode=args.debug
+        debug_mode=args.debug,
+        workers=args.workers,
+        road_index=road_index,
+        min_distance=args.min_distance
     )
 
 if __name__ == "__main__":